@@ -0,0 +1,244 @@
+"""
+History Analytics
+Column-oriented store of saved commands with running aggregates.
+
+Features:
+- Each save becomes one row of typed columns (dictionary-encoded strings)
+- Rows carry the widget values the command was built from; the prompt text,
+  which holds free user input, is never parsed
+- Counters for presets, --sw, --stylize, --ar and --cref updated on insert
+- Views read only the aggregates, so render cost does not grow with row count
+- to_frame() exposes the raw columns as a pandas DataFrame for ad-hoc analysis
+- Rows live in a non-expiring append-only list in the shared state backend, so
+  every replica rebuilds the same columns and pulls in new rows as they arrive
+
+Usage:
+- python analytics.py --rows 1000000   (insert and view timing benchmark)
+- python analytics.py --rows 1000000 --state sqlite:///bench_state.db   (plus rebuild from a backend)
+"""
+
+import argparse
+import threading
+import time
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Reserved session id under which rows are kept in the state backend
+STORE_SID = "__analytics__"
+STORE_KEY = "saves"
+# Rows read per backend call while syncing
+SYNC_CHUNK = 50_000
+
+# Numeric columns and dictionary codes are uint16
+MAX_VALUE = 0xFFFF
+MAX_AR_LEN = 16
+# Distinct values past the code space are counted here
+OTHER = "other"
+
+
+# -----------------------------
+# Columnar Store
+# -----------------------------
+class HistoryColumns:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        # Dictionary encoding: codes per row, values looked up once per distinct string
+        self._presets: Dict[str, int] = {}
+        self._ars: Dict[str, int] = {}
+        self.preset = array("H")
+        self.ar = array("H")
+        self.sw = array("H")
+        self.stylize = array("H")
+        self.cref = array("b")
+        self.saved_at = array("d")
+        # Running aggregates
+        self.preset_counts: Counter = Counter()
+        self.sw_counts: Counter = Counter()
+        self.stylize_counts: Counter = Counter()
+        self.ar_counts: Counter = Counter()
+        self.cref_count = 0
+        # Backend position of the next unread row and the last row read, to spot a cleared list
+        self._position = 0
+        self._last: Optional[Dict] = None
+        self._synced_at = 0.0
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.preset)
+
+    @property
+    def loading(self) -> bool:
+        """True while a sync (such as the startup rebuild) is reading the backend."""
+        return self._sync_lock.locked()
+
+    @staticmethod
+    def row(entry: Dict) -> Dict:
+        """Analytics row from a history entry's id, preset and widget values."""
+        return {k: entry[k] for k in ("id", "preset_id", "sw", "stylize", "ar", "cref", "saved_at")}
+
+    @staticmethod
+    def _clean(row: Dict) -> Tuple[str, int, int, str, bool, float]:
+        """Validated, clamped row values. Raises KeyError/TypeError/ValueError for malformed rows."""
+        return (
+            str(row["preset_id"]),
+            min(max(int(row["sw"]), 0), MAX_VALUE),
+            min(max(int(row["stylize"]), 0), MAX_VALUE),
+            str(row["ar"])[:MAX_AR_LEN],
+            bool(row["cref"]),
+            float(row["saved_at"]),
+        )
+
+    @staticmethod
+    def _code(table: Dict[str, int], value: str) -> str:
+        """`value`, or OTHER once the dictionary has run out of uint16 codes."""
+        if value not in table and len(table) >= MAX_VALUE:
+            return OTHER
+        return value
+
+    def add(self, entry: Dict):
+        """Add one history entry; see `row` for the fields it needs."""
+        self.add_row(self.row(entry))
+
+    def add_row(self, row: Dict):
+        """Append one row. Malformed rows raise before anything changes, so columns stay aligned."""
+        preset_id, sw, stylize, ar, has_cref, saved_at = self._clean(row)
+        with self._lock:
+            preset_id, ar = self._code(self._presets, preset_id), self._code(self._ars, ar)
+            self.preset.append(self._presets.setdefault(preset_id, len(self._presets)))
+            self.ar.append(self._ars.setdefault(ar, len(self._ars)))
+            self.sw.append(sw)
+            self.stylize.append(stylize)
+            self.cref.append(has_cref)
+            self.saved_at.append(saved_at)
+            self.preset_counts[preset_id] += 1
+            self.sw_counts[sw] += 1
+            self.stylize_counts[stylize] += 1
+            self.ar_counts[ar] += 1
+            self.cref_count += has_cref
+
+    def add_many(self, entries: List[Dict]):
+        for entry in entries:
+            self.add(entry)
+
+    def sync(self, backend, min_interval: float = 5.0) -> int:
+        """Pull rows appended to the state backend since the last sync. Returns the number added.
+
+        Runs at most once per `min_interval` seconds per process, so reruns
+        don't each pay for a backend round trip, and returns at once while
+        another sync is running. Reads in chunks, so a large rebuild fills the
+        aggregates progressively. If the list no longer holds the last row
+        read (it was cleared), everything is rebuilt. Malformed rows are
+        counted in `skipped` rather than stopping the sync.
+        """
+        if self._synced_at and time.monotonic() - self._synced_at < min_interval:
+            return 0
+        if not self._sync_lock.acquire(blocking=False):
+            return 0
+        try:
+            if self._last is not None:
+                head = backend.read_list(STORE_SID, STORE_KEY, start=self._position - 1, limit=1)
+                if head != [self._last]:
+                    with self._lock:
+                        self._clear()
+            added = 0
+            while True:
+                rows = backend.read_list(STORE_SID, STORE_KEY, start=self._position, limit=SYNC_CHUNK)
+                for row in rows:
+                    try:
+                        self.add_row(row)
+                        added += 1
+                    except (KeyError, TypeError, ValueError):
+                        self.skipped += 1
+                if rows:
+                    self._position += len(rows)
+                    self._last = rows[-1]
+                if len(rows) < SYNC_CHUNK:
+                    break
+            self._synced_at = time.monotonic()
+            return added
+        finally:
+            self._sync_lock.release()
+
+    def summary(self, names: Dict[str, str] = None) -> Dict:
+        """Pre-aggregated tables for the analytics view; `names` maps preset ids to labels."""
+        names = names or {}
+        with self._lock:
+            presets = Counter({names.get(k, k or "—"): v for k, v in self.preset_counts.items()})
+            sw = sorted(self.sw_counts.items())
+            stylize = sorted(self.stylize_counts.items())
+            ar = self.ar_counts.most_common()
+            total, cref = len(self), self.cref_count
+        return {
+            "total": total,
+            "cref_rate": cref / total if total else 0.0,
+            "presets": pd.DataFrame(presets.most_common(), columns=["preset", "saves"]).set_index("preset"),
+            "sw": pd.DataFrame(sw, columns=["sw", "saves"]).set_index("sw"),
+            "stylize": pd.DataFrame(stylize, columns=["stylize", "saves"]).set_index("stylize"),
+            "ar": pd.DataFrame(ar, columns=["ar", "saves"]).set_index("ar"),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """All rows as a DataFrame with categorical preset/ar columns (no string copies)."""
+        with self._lock:
+            return pd.DataFrame({
+                "preset_id": pd.Categorical.from_codes(self.preset, list(self._presets)),
+                "ar": pd.Categorical.from_codes(self.ar, list(self._ars)),
+                "sw": pd.array(self.sw, dtype="uint16"),
+                "stylize": pd.array(self.stylize, dtype="uint16"),
+                "cref": pd.array(self.cref, dtype="bool"),
+                "saved_at": pd.to_datetime(pd.array(self.saved_at, dtype="float64"), unit="s"),
+            })
+
+
+def main():
+    import random
+    import uuid
+    from presets import PRESETS
+    from state import backend_from_url
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--state", default="", help="Also time a rebuild from this state backend URL")
+    args = parser.parse_args()
+
+    # A pool of realistic rows, reused so the benchmark measures inserts, not generation
+    pool = [
+        {"id": uuid.uuid4().hex, "preset_id": p.id, "sw": random.randrange(0, 1001, 5),
+         "stylize": random.randrange(0, 1001, 50), "ar": random.choice(["2:3", "16:9", "1:1"]),
+         "cref": random.random() < 0.25, "saved_at": time.time()}
+        for p in PRESETS for _ in range(50)
+    ]
+    columns = HistoryColumns()
+    start = time.perf_counter()
+    for i in range(args.rows):
+        columns.add_row(pool[i % len(pool)])
+    elapsed = time.perf_counter() - start
+    print(f"insert   {args.rows} rows in {elapsed:.2f}s ({elapsed / args.rows * 1e6:.1f} µs/row)")
+
+    if args.state:
+        backend = backend_from_url(args.state)
+        backend.clear_list(STORE_SID, STORE_KEY)
+        for i in range(0, args.rows, SYNC_CHUNK):
+            backend.append(STORE_SID, STORE_KEY, [pool[j % len(pool)] for j in range(i, min(args.rows, i + SYNC_CHUNK))])
+        start = time.perf_counter()
+        HistoryColumns().sync(backend)
+        print(f"rebuild  {args.rows} rows from {args.state} in {time.perf_counter() - start:.2f}s")
+
+    names = {p.id: p.name for p in PRESETS}
+    timings = []
+    for _ in range(20):
+        start = time.perf_counter()
+        columns.summary(names)
+        timings.append(time.perf_counter() - start)
+    print(f"summary  median {sorted(timings)[10] * 1000:.2f} ms over {len(columns)} rows")
+
+
+if __name__ == "__main__":
+    main()
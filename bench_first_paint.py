@@ -0,0 +1,80 @@
+"""
+First-Paint Benchmark
+Loads running app instances in headless Chromium and compares paint timing.
+
+Usage:
+- pip install playwright && playwright install chromium
+- python bench_first_paint.py http://localhost:8501 http://localhost:8502 --runs 10
+
+Run one instance from the old tree and one from the new, then pass both URLs.
+For each it reports first-contentful-paint, when the theme fonts were ready,
+and how many requests went to other origins.
+"""
+
+import argparse
+import statistics
+from urllib.parse import urlparse
+
+try:
+    from playwright.sync_api import sync_playwright
+    HAS_PLAYWRIGHT = True
+except ImportError:
+    HAS_PLAYWRIGHT = False
+
+# Streamlit renders the app after the websocket delivers the first script run,
+# so wait for the title before reading paint entries.
+READY_SELECTOR = "h1"
+
+PAINT_JS = """() => ({
+    fcp: (performance.getEntriesByName('first-contentful-paint')[0] || {}).startTime,
+})"""
+
+FONTS_READY_JS = "() => document.fonts.ready.then(() => performance.now())"
+
+
+def summarize(values) -> str:
+    # Chromium may record no paint entry, e.g. when the page never rendered
+    if not values:
+        return "n/a"
+    return f"median {statistics.median(values):.0f} ms  max {max(values):.0f} ms"
+
+
+def measure(browser, url: str) -> dict:
+    # Fresh context per run: cold cache, like a first visit
+    context = browser.new_context()
+    page = context.new_page()
+    origin = urlparse(url).netloc
+    external = []
+    page.on("request", lambda r: urlparse(r.url).netloc not in (origin, "") and external.append(r.url))
+    page.goto(url, wait_until="domcontentloaded")
+    page.wait_for_selector(READY_SELECTOR, timeout=30000)
+    result = page.evaluate(PAINT_JS)
+    result["fonts"] = page.evaluate(FONTS_READY_JS)
+    result["external"] = len(external)
+    context.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    if not HAS_PLAYWRIGHT:
+        raise SystemExit("playwright is required: pip install playwright && playwright install chromium")
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        for url in args.urls:
+            runs = [measure(browser, url) for _ in range(args.runs)]
+            fcp = [r["fcp"] for r in runs if r["fcp"] is not None]
+            fonts = [r["fonts"] for r in runs]
+            print(url)
+            print(f"  first-contentful-paint  {summarize(fcp)}")
+            print(f"  fonts ready             {summarize(fonts)}")
+            print(f"  external requests       {max(r['external'] for r in runs)}")
+        browser.close()
+
+
+if __name__ == "__main__":
+    main()
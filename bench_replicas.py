@@ -0,0 +1,89 @@
+"""
+Multi-Replica Load Test
+Runs N app replicas against one shared state backend and measures throughput.
+
+Each replica is a separate process executing the real script through
+Streamlit's AppTest harness. Sessions are drawn from a shared pool of ids, so
+consecutive requests for one user land on different replicas (no stickiness)
+and must be served from the external state.
+
+Usage:
+- python bench_replicas.py --replicas 1 2 4 --backend sqlite:///bench_state.db
+- python bench_replicas.py --replicas 1 2 4 --fake-redis   (needs fakeredis)
+
+With sessions << requests nearly every request should report restored state;
+with memory:// a replica can only restore sessions it has served itself.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import time
+import uuid
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+
+def replica(backend_url: str, sids, duration: float, results):
+    """Serve random sessions for `duration` seconds; each request is a fresh AppTest session."""
+    os.environ["NIJI_STATE_BACKEND"] = backend_url
+    from streamlit.testing.v1 import AppTest
+
+    requests = restored = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        sid = random.choice(sids)
+        at = AppTest.from_file(APP, default_timeout=30)
+        at.query_params["sid"] = sid
+        at.run()
+        # Whatever replica served this session last left a marker in `scene`
+        restored += at.session_state.scene.startswith("marker-")
+        at.text_input(key="scene_in").set_value(f"marker-{uuid.uuid4().hex[:6]}").run()
+        requests += 1
+    results.put((requests, restored))
+
+
+def run(backend_url: str, replicas: int, sessions: int, duration: float) -> float:
+    sids = [uuid.uuid4().hex for _ in range(sessions)]
+    results = mp.Queue()
+    procs = [mp.Process(target=replica, args=(backend_url, sids, duration, results)) for _ in range(replicas)]
+    for p in procs:
+        p.start()
+    counts = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    total = sum(c[0] for c in counts)
+    restored = sum(c[1] for c in counts)
+    rate = total / duration
+    print(f"replicas {replicas:>2}  {total:>5} requests  {rate:7.1f} req/s  {restored} with state restored")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", default="sqlite:///bench_state.db")
+    parser.add_argument("--fake-redis", action="store_true", help="Start a local fakeredis TCP server and use it")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    backend_url = args.backend
+    if args.fake_redis:
+        import threading
+        from fakeredis import TcpFakeServer
+        server = TcpFakeServer(("127.0.0.1", 0))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        backend_url = "redis://%s:%d/0" % server.server_address
+
+    print(f"backend {backend_url}, {os.cpu_count()} CPUs (scaling flattens past that)")
+    base = None
+    for n in args.replicas:
+        rate = run(backend_url, n, args.sessions, args.duration)
+        base = base or rate / n
+        print(f"           scaling efficiency {rate / (base * n):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Static Asset Build
+Vendors the theme fonts and emits fingerprinted files into ./static.
+
+Features:
+- Subsets Outfit and JetBrains Mono to Latin and writes WOFF2
+- Minifies assets/theme.css with generated @font-face rules
+- Content-hash filenames plus static/manifest.json for the app
+- Downloads the OFL font sources from google/fonts on first build
+- Removes stale builds so ./static only holds the current set
+
+Usage:
+- pip install fonttools brotli
+- python build_assets.py             (fetches missing fonts into assets/fonts/)
+- python build_assets.py --offline   (use fonts already placed in assets/fonts/)
+
+The app runs the same build on first start when static/manifest.json is missing.
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import urllib.request
+
+from fontTools import subset
+from fontTools.ttLib import TTFont
+from fontTools.varLib import instancer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSETS = os.path.join(ROOT, "assets")
+STATIC = os.path.join(ROOT, "static")
+# Streamlit serves ./static at this path when server.enableStaticServing is on
+STATIC_URL = "app/static"
+
+# (family, source file, weight range the theme uses)
+FONTS = [
+    ("Outfit", "Outfit[wght].ttf", (400, 700)),
+    ("JetBrains Mono", "JetBrainsMono[wght].ttf", (400, 500)),
+]
+FONT_SOURCES = {
+    "Outfit[wght].ttf": "https://github.com/google/fonts/raw/main/ofl/outfit/Outfit%5Bwght%5D.ttf",
+    "JetBrainsMono[wght].ttf": "https://github.com/google/fonts/raw/main/ofl/jetbrainsmono/JetBrainsMono%5Bwght%5D.ttf",
+}
+
+# Basic Latin, Latin-1, general punctuation (bullets, dashes, quotes), euro, trademark
+UNICODES = "U+0000-00FF,U+2010-2027,U+2030-203A,U+20AC,U+2122"
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def fingerprint(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def build_font(source: str, weights) -> bytes:
+    """Pin a variable font to the used weight range, then subset to WOFF2."""
+    # Keep the head timestamp so identical inputs give identical hashes
+    font = TTFont(source, recalcTimestamp=False)
+    if "fvar" in font:
+        font = instancer.instantiateVariableFont(font, {"wght": weights})
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(UNICODES))
+    subsetter.subset(font)
+    out = io.BytesIO()
+    font.flavor = "woff2"
+    font.save(out)
+    return out.getvalue()
+
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r"([{;])\s*([\w-]+)\s*:\s*", r"\1\2:", css)
+    return css.replace(";}", "}").strip()
+
+
+def fetch_font(filename: str, timeout: float = 30.0) -> str:
+    """Download a font source into assets/fonts/ unless it is already there. Returns its path."""
+    path = os.path.join(ASSETS, "fonts", filename)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(FONT_SOURCES[filename], timeout=timeout) as resp:
+        data = resp.read()
+    # Write then rename, so a failed or concurrent download never leaves half a font
+    tmp = f"{path}.{os.getpid()}.part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+def write(name: str, data: bytes) -> str:
+    out = fingerprint(name, data)
+    with open(os.path.join(STATIC, out), "wb") as f:
+        f.write(data)
+    return out
+
+
+# -----------------------------
+# Build
+# -----------------------------
+def build(offline: bool = False) -> dict:
+    """Build ./static and return the manifest. Raises OSError if a font cannot be found or fetched."""
+    os.makedirs(STATIC, exist_ok=True)
+
+    faces, fonts = [], {}
+    for family, filename, (lo, hi) in FONTS:
+        source = os.path.join(ASSETS, "fonts", filename)
+        if not os.path.exists(source):
+            if offline:
+                raise FileNotFoundError(f"Missing {source} - download it from github.com/google/fonts (OFL)")
+            source = fetch_font(filename)
+        slug = family.lower().replace(" ", "-")
+        fonts[family] = write(f"{slug}.woff2", build_font(source, (lo, hi)))
+        faces.append(
+            f"@font-face{{font-family:'{family}';font-style:normal;font-weight:{lo} {hi};"
+            f"font-display:swap;src:url('{STATIC_URL}/{fonts[family]}') format('woff2')}}"
+        )
+
+    with open(os.path.join(ASSETS, "theme.css")) as f:
+        css = "".join(faces) + minify_css(f.read())
+    manifest = {"theme": write("theme.css", css.encode()), "fonts": fonts}
+    # Manifest last and atomically: readers never see one pointing at missing files
+    tmp = os.path.join(STATIC, f"manifest.json.{os.getpid()}.part")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(STATIC, "manifest.json"))
+
+    # Stale files go after the new set is in place, so replicas building at once stay consistent
+    current = {manifest["theme"], *fonts.values()}
+    for stale in glob.glob(os.path.join(STATIC, "*-??????????.*")):
+        if os.path.basename(stale) not in current:
+            os.remove(stale)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offline", action="store_true", help="Do not download missing font sources")
+    args = parser.parse_args()
+    try:
+        manifest = build(offline=args.offline)
+    except OSError as e:
+        raise SystemExit(f"Build failed: {e}")
+    for name in [manifest["theme"], *manifest["fonts"].values()]:
+        print(f"static/{name}  {os.path.getsize(os.path.join(STATIC, name)) / 1024:.1f} KB")
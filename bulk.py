@@ -0,0 +1,219 @@
+"""
+Bulk Prompt Builder
+Expands a spec into /imagine commands for every preset, rebuilding incrementally.
+
+Features:
+- Output split into per-preset shards of `shard_size` commands
+- Build graph in <out>/.build.json: each shard records the preset fingerprint,
+  parameter fingerprint and builder version it was generated from
+- Only shards whose inputs changed are regenerated; presets that are gone are removed
+- Watch mode rebuilds when the catalog or the spec file changes
+
+Usage:
+- python bulk.py spec.json --out bulk_out
+- python bulk.py spec.json --out bulk_out --watch
+
+Spec (JSON): subjects, scenes, stylize, ar, sw (optional; defaults to each
+preset's own), cref, cw, sexy_mode, presets (optional id list), shard_size.
+"""
+
+import argparse
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import time
+from typing import Dict
+
+import presets
+
+MANIFEST = ".build.json"
+DEFAULT_SHARD_SIZE = 100_000
+# Only these fields reach build_command, so only they invalidate output
+PRESET_INPUTS = ("base_prompt", "profile", "sref", "sw")
+
+
+# -----------------------------
+# Fingerprints
+# -----------------------------
+def digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def preset_fingerprint(preset: presets.StylePreset) -> str:
+    return digest({k: getattr(preset, k) for k in PRESET_INPUTS})
+
+
+def builder_fingerprint() -> str:
+    """Changes to build_command itself invalidate every shard."""
+    return digest(inspect.getsource(presets.build_command))
+
+
+def load_spec(path: str) -> Dict:
+    with open(path) as f:
+        spec = json.load(f)
+    spec.setdefault("subjects", [""])
+    spec.setdefault("scenes", [""])
+    spec.setdefault("stylize", [100])
+    spec.setdefault("ar", ["2:3"])
+    spec.setdefault("cref", "")
+    spec.setdefault("cw", 20)
+    spec.setdefault("sexy_mode", False)
+    spec.setdefault("shard_size", DEFAULT_SHARD_SIZE)
+    return spec
+
+
+# -----------------------------
+# Build Graph
+# -----------------------------
+def plan(spec: Dict) -> Dict[str, Dict]:
+    """Every shard the spec should produce, keyed by relative path, with its inputs."""
+    params = digest({k: v for k, v in spec.items() if k != "presets"})
+    builder = builder_fingerprint()
+    wanted = set(spec.get("presets") or [p.id for p in presets.PRESETS])
+    shards = {}
+    for preset in presets.PRESETS:
+        if preset.id not in wanted:
+            continue
+        total = len(combos(spec, preset))
+        for i in range(-(-total // spec["shard_size"])):
+            shards[f"{preset.id}/shard-{i:05d}.txt"] = {
+                "preset_id": preset.id,
+                "index": i,
+                "preset": preset_fingerprint(preset),
+                "params": params,
+                "builder": builder,
+            }
+    return shards
+
+
+def combos(spec: Dict, preset: presets.StylePreset):
+    """Lazy cartesian product of the per-command parameters for one preset."""
+    return Product(spec["subjects"], spec["scenes"], spec.get("sw") or [preset.sw], spec["stylize"], spec["ar"])
+
+
+class Product:
+    """Indexable cartesian product, so a shard can start mid-sequence without iterating to it."""
+
+    def __init__(self, *axes):
+        self.axes = axes
+
+    def __len__(self):
+        n = 1
+        for axis in self.axes:
+            n *= len(axis)
+        return n
+
+    def range(self, start: int, stop: int):
+        """Yield items start..stop-1, decoding `start` as a mixed-radix number (last axis fastest)."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return
+        idx, rem = [], start
+        for axis in reversed(self.axes):
+            rem, r = divmod(rem, len(axis))
+            idx.append(r)
+        idx.reverse()
+        last = len(self.axes) - 1
+        for _ in range(stop - start):
+            yield tuple(axis[i] for axis, i in zip(self.axes, idx))
+            d = last
+            while d >= 0:
+                idx[d] += 1
+                if idx[d] < len(self.axes[d]):
+                    break
+                idx[d] = 0
+                d -= 1
+
+
+def write_shard(out: str, path: str, spec: Dict, preset: presets.StylePreset, index: int):
+    size = spec["shard_size"]
+    full = os.path.join(out, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    cref, cw, sexy = spec["cref"], spec["cw"], spec["sexy_mode"]
+    rows = combos(spec, preset).range(index * size, (index + 1) * size)
+    with open(full + ".tmp", "w") as f:
+        f.writelines(
+            presets.build_command(preset, subject, scene, sw, stylize, ar, cref, cw, sexy) + "\n"
+            for subject, scene, sw, stylize, ar in rows
+        )
+    os.replace(full + ".tmp", full)
+
+
+def build(spec_path: str, out: str) -> Dict[str, int]:
+    """Bring `out` up to date with the spec and catalog. Returns counts per action."""
+    spec = load_spec(spec_path)
+    manifest_path = os.path.join(out, MANIFEST)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    shards = plan(spec)
+    by_id = {p.id: p for p in presets.PRESETS}
+    stats = {"built": 0, "unchanged": 0, "removed": 0}
+    for path, deps in shards.items():
+        if previous.get(path) == deps and os.path.exists(os.path.join(out, path)):
+            stats["unchanged"] += 1
+            continue
+        write_shard(out, path, spec, by_id[deps["preset_id"]], deps["index"])
+        stats["built"] += 1
+
+    for path in set(previous) - set(shards):
+        full = os.path.join(out, path)
+        if os.path.exists(full):
+            os.remove(full)
+        stats["removed"] += 1
+
+    os.makedirs(out, exist_ok=True)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(shards, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return stats
+
+
+def watch(spec_path: str, out: str, interval: float = 1.0):
+    """Poll the catalog and spec for changes; reload the catalog and rebuild."""
+    sources = [presets.__file__, spec_path]
+    mtimes = None
+    while True:
+        current = [os.path.getmtime(p) for p in sources]
+        if current != mtimes:
+            first, mtimes = mtimes is None, current
+            if not first:
+                try:
+                    importlib.reload(presets)
+                except Exception as e:
+                    # Half-saved catalog; wait for the next change
+                    print(f"Catalog failed to load: {e}")
+                    continue
+            run(spec_path, out)
+        time.sleep(interval)
+
+
+def run(spec_path: str, out: str):
+    start = time.perf_counter()
+    try:
+        stats = build(spec_path, out)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"Build failed: {e}")
+        return
+    print(f"{stats['built']} built, {stats['unchanged']} unchanged, {stats['removed']} removed "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spec", help="Bulk spec JSON file")
+    parser.add_argument("--out", default="bulk_out")
+    parser.add_argument("--watch", action="store_true")
+    args = parser.parse_args()
+    if args.watch:
+        watch(args.spec, args.out)
+    else:
+        run(args.spec, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Render Dispatcher
+Submits built /imagine commands to a pluggable render backend.
+
+Features:
+- Token-bucket rate limit and concurrency cap
+- Retry with jittered exponential backoff
+- Persistent SQLite job queue, resumed after a crash
+- Background event loop so Streamlit reruns never block on submissions
+"""
+
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, List
+
+# Job states. Anything not terminal is picked up again on resume.
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+TERMINAL = (DONE, FAILED)
+
+
+# -----------------------------
+# Data Models
+# -----------------------------
+@dataclass
+class Job:
+    id: str
+    command: str
+    preset_id: str = ""
+    status: str = QUEUED
+    attempts: int = 0
+    result: str = ""
+    error: str = ""
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+
+class BackendError(Exception):
+    """Raised by a backend; `retryable` decides whether the job is retried."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# -----------------------------
+# Persistent Job Queue
+# -----------------------------
+class JobStore:
+    """SQLite-backed job table, safe to share between the UI and the dispatcher thread."""
+
+    def __init__(self, path: str = "render_jobs.db"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                command TEXT NOT NULL,
+                preset_id TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT NOT NULL DEFAULT '',
+                error TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.commit()
+
+    def add(self, command: str, preset_id: str = "") -> Job:
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, command=command, preset_id=preset_id, created_at=now, updated_at=now)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.command, job.preset_id, job.status, job.attempts,
+                 job.result, job.error, job.created_at, job.updated_at),
+            )
+            self._db.commit()
+        return job
+
+    def update(self, job: Job):
+        job.updated_at = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status=?, attempts=?, result=?, error=?, updated_at=? WHERE id=?",
+                (job.status, job.attempts, job.result, job.error, job.updated_at, job.id),
+            )
+            self._db.commit()
+
+    def unfinished(self) -> List[Job]:
+        """Jobs that were queued or in flight when the process last stopped."""
+        return self._select(
+            "SELECT * FROM jobs WHERE status NOT IN (?, ?) ORDER BY created_at", TERMINAL
+        )
+
+    def recent(self, limit: int = 20) -> List[Job]:
+        return self._select("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+
+    def _select(self, sql: str, args) -> List[Job]:
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [Job(*row) for row in rows]
+
+
+# -----------------------------
+# Rate Limiting
+# -----------------------------
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class RenderBackend:
+    """Interface for render services. `submit` returns a result reference (URL or job id).
+
+    `idempotency_key` is the job id. It is the same on every attempt and after a
+    resume, so a service that honours it renders (and bills) each job once.
+    """
+
+    async def submit(self, command: str, idempotency_key: str = "") -> str:
+        raise NotImplementedError
+
+
+class HttpBackend(RenderBackend):
+    """POSTs `{"command": ...}` as JSON with an Idempotency-Key header and reads `image_url` from the response."""
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def submit(self, command: str, idempotency_key: str = "") -> str:
+        return await asyncio.to_thread(self._post, command, idempotency_key)
+
+    def _post(self, command: str, idempotency_key: str = "") -> str:
+        body = json.dumps({"command": command}).encode()
+        headers = {"Content-Type": "application/json"}
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        req = urllib.request.Request(self.url, data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            # 429 and 5xx are transient; other client errors will not succeed on retry
+            raise BackendError(f"HTTP {e.code}", retryable=e.code == 429 or e.code >= 500)
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise BackendError(str(e))
+        return payload.get("image_url") or payload.get("job_id", "")
+
+
+# -----------------------------
+# Dispatcher
+# -----------------------------
+class Dispatcher:
+    def __init__(
+        self,
+        store: JobStore,
+        backend: RenderBackend,
+        rate: float = 2.0,
+        burst: int = 4,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        latency_window: int = 10_000,
+    ):
+        self.store = store
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Seconds from enqueue to terminal state for the most recent jobs, including
+        # queue and rate-limit wait (for benchmarks)
+        self.latencies = deque(maxlen=latency_window)
+        # Seconds from submit to backend response, per attempt: the service's own latency
+        self.submit_latencies = deque(maxlen=latency_window)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    # --- thread-facing API (used by the Streamlit script) ---
+    def start(self, timeout: float = 10.0):
+        """Run the dispatcher on a daemon thread with its own event loop.
+
+        Raises RuntimeError if the loop fails during startup (e.g. the job
+        store cannot be read) or is not ready within `timeout` seconds.
+        """
+        threading.Thread(target=self._thread_main, daemon=True, name="render-dispatcher").start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"Render dispatcher did not start within {timeout}s")
+        if self._error is not None:
+            raise RuntimeError(f"Render dispatcher failed to start: {self._error!r}") from self._error
+
+    def _thread_main(self):
+        try:
+            asyncio.run(self.run())
+        except BaseException as e:
+            self._error = e
+            # Unblock start() if we died before the loop was ready
+            self._ready.set()
+
+    def enqueue(self, command: str, preset_id: str = "") -> Job:
+        """Persist a job and hand it to the running loop. Returns immediately."""
+        job = self.store.add(command, preset_id)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job
+
+    # --- loop-side ---
+    async def run(self, stop_when_idle: bool = False):
+        """Process jobs until cancelled, or until the queue drains if `stop_when_idle`."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._bucket = TokenBucket(self.rate, self.burst)
+        for job in self.store.unfinished():
+            self._queue.put_nowait(job)
+        self._ready.set()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            if stop_when_idle:
+                await self._queue.join()
+            else:
+                await asyncio.Event().wait()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: Job):
+        while True:
+            await self._bucket.acquire()
+            job.status = RUNNING
+            job.attempts += 1
+            self.store.update(job)
+            sent = time.monotonic()
+            try:
+                job.result = await self.backend.submit(job.command, idempotency_key=job.id)
+                job.status, job.error = DONE, ""
+                break
+            except BackendError as e:
+                job.error = str(e)
+                if not e.retryable or job.attempts >= self.max_attempts:
+                    job.status = FAILED
+                    break
+            except Exception as e:
+                # A backend bug should fail the job, not kill the worker
+                job.status, job.error = FAILED, repr(e)
+                break
+            finally:
+                self.submit_latencies.append(time.monotonic() - sent)
+            job.status = RETRYING
+            self.store.update(job)
+            await asyncio.sleep(self._backoff(job.attempts))
+        self.store.update(job)
+        self.latencies.append(job.updated_at - job.created_at)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
@@ -0,0 +1,292 @@
+"""
+Render Gallery
+Links generated images to history entries and finds near-duplicate outputs.
+
+Features:
+- Ingest local image files, tagged with preset id and history entry
+- 64-bit difference hashes (dHash) computed in a process pool
+- In-memory multi-index hash table for Hamming-distance lookups
+- Lazily generated, disk-cached thumbnails
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, List, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp")
+THUMB_SIZE = (256, 256)
+
+
+# -----------------------------
+# Data Models
+# -----------------------------
+@dataclass
+class GalleryImage:
+    id: int
+    path: str
+    phash: int
+    preset_id: str = ""
+    history_id: str = ""
+    cmd: str = ""
+    created_at: float = 0.0
+
+
+# -----------------------------
+# Perceptual Hashing
+# -----------------------------
+def dhash(path: str) -> int:
+    """Difference hash: compare each pixel to its right neighbour on a 9x8 grayscale grid."""
+    with Image.open(path) as img:
+        px = list(img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits
+
+
+def safe_dhash(path: str) -> Optional[int]:
+    """dhash, or None for files that are missing or not decodable images."""
+    try:
+        return dhash(path)
+    except (OSError, UnidentifiedImageError, ValueError):
+        return None
+
+
+def hash_files(paths: List[str], workers: Optional[int] = None) -> List[Optional[int]]:
+    """Hash many files in parallel; decoding and resizing is CPU-bound. Failures are None."""
+    if len(paths) < 8:
+        return [safe_dhash(p) for p in paths]
+    # Spawn, not fork: forking the multi-threaded Streamlit server can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(safe_dhash, paths, chunksize=16))
+
+
+def within_root(path: str, root: str) -> bool:
+    """True if `path` resolves (following symlinks) to `root` or something below it."""
+    path, root = os.path.realpath(path), os.path.realpath(root)
+    return os.path.commonpath([path, root]) == root
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# -----------------------------
+# Multi-Index Hash Table
+# -----------------------------
+CHUNKS = 8
+CHUNK_BITS = 64 // CHUNKS
+MAX_INDEXED_DISTANCE = CHUNKS - 1
+
+
+class MultiIndexHash:
+    """Hamming-distance index that splits each 64-bit hash into 8 byte-wide chunks.
+
+    By pigeonhole, two hashes within distance 7 agree exactly on at least one
+    chunk, so a query only checks hashes sharing a bucket with it instead of
+    scanning everything. Wider searches fall back to a linear scan.
+    """
+
+    def __init__(self):
+        self._tables = [{} for _ in range(CHUNKS)]
+        self._hashes = {}
+
+    @property
+    def size(self) -> int:
+        return len(self._hashes)
+
+    def add(self, h: int, item_id: int):
+        self._hashes[item_id] = h
+        for i, table in enumerate(self._tables):
+            table.setdefault((h >> (i * CHUNK_BITS)) & 0xFF, []).append(item_id)
+
+    def remove(self, item_id: int):
+        h = self._hashes.pop(item_id, None)
+        if h is None:
+            return
+        for i, table in enumerate(self._tables):
+            table[(h >> (i * CHUNK_BITS)) & 0xFF].remove(item_id)
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[int, int]]:
+        """All (distance, id) within `max_distance` of `h`, closest first."""
+        if max_distance > MAX_INDEXED_DISTANCE:
+            candidates = self._hashes
+        else:
+            candidates = set()
+            for i, table in enumerate(self._tables):
+                candidates.update(table.get((h >> (i * CHUNK_BITS)) & 0xFF, ()))
+        found = []
+        for item_id in candidates:
+            d = hamming(h, self._hashes[item_id])
+            if d <= max_distance:
+                found.append((d, item_id))
+        found.sort()
+        return found
+
+
+# -----------------------------
+# Gallery Store
+# -----------------------------
+class Gallery:
+    def __init__(self, path: str = "gallery.db", thumb_dir: str = ".gallery_thumbs"):
+        self.thumb_dir = thumb_dir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS images (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                phash INTEGER NOT NULL,
+                preset_id TEXT NOT NULL DEFAULT '',
+                history_id TEXT NOT NULL DEFAULT '',
+                cmd TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS images_history ON images (history_id)")
+        self._db.commit()
+        self._index = MultiIndexHash()
+        # SQLite INTEGER is signed 64-bit, so hashes are stored shifted into that range
+        for row_id, h in self._db.execute("SELECT id, phash FROM images"):
+            self._index.add(h + (1 << 63), row_id)
+
+    def ingest(self, paths: List[str], preset_id: str = "", history_id: str = "", cmd: str = "",
+               root: Optional[str] = None) -> Tuple[int, int]:
+        """Hash and record new image files (directories are scanned).
+
+        Unreadable files, and with `root` set any file resolving outside it,
+        are skipped rather than failing the batch. Returns (added, skipped).
+        """
+        files = []
+        for p in paths:
+            if os.path.isdir(p):
+                files.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.lower().endswith(IMAGE_EXTS))
+            else:
+                files.append(p)
+        files = [os.path.abspath(f) for f in files]
+        outside = 0
+        if root is not None:
+            allowed = [f for f in files if within_root(f, root)]
+            outside, files = len(files) - len(allowed), allowed
+        with self._lock:
+            known = {r[0] for r in self._db.execute("SELECT path FROM images")}
+        files = [f for f in dict.fromkeys(files) if f not in known]
+        if not files:
+            return 0, outside
+
+        hashes = hash_files(files)
+        added = 0
+        now = time.time()
+        with self._lock:
+            for f, h in zip(files, hashes):
+                if h is None:
+                    continue
+                added += 1
+                cur = self._db.execute(
+                    "INSERT INTO images (path, phash, preset_id, history_id, cmd, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (f, h - (1 << 63), preset_id, history_id, cmd, now),
+                )
+                self._index.add(h, cur.lastrowid)
+            self._db.commit()
+        return added, len(files) - added + outside
+
+    def count(self) -> int:
+        return self._index.size
+
+    def page(self, page: int, per_page: int = 12) -> List[GalleryImage]:
+        """Newest first; `page` is zero-based."""
+        return self._select("SELECT * FROM images ORDER BY id DESC LIMIT ? OFFSET ?", (per_page, page * per_page))
+
+    def for_history(self, history_id: str) -> List[GalleryImage]:
+        return self._select("SELECT * FROM images WHERE history_id = ? ORDER BY id", (history_id,))
+
+    def for_histories(self, history_ids: List[str], limit: int = 4) -> Dict[str, List[GalleryImage]]:
+        """Linked images for many history entries in one query, up to `limit` each."""
+        if not history_ids:
+            return {}
+        linked: Dict[str, List[GalleryImage]] = {}
+        for g in self._select(
+            f"SELECT * FROM images WHERE history_id IN ({','.join('?' * len(history_ids))}) ORDER BY id",
+            list(history_ids),
+        ):
+            group = linked.setdefault(g.history_id, [])
+            if len(group) < limit:
+                group.append(g)
+        return linked
+
+    def prune_missing(self) -> int:
+        """Drop rows whose image file no longer exists. Returns the number removed."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, path FROM images").fetchall()
+        gone = [row_id for row_id, path in rows if not os.path.exists(path)]
+        if gone:
+            with self._lock:
+                self._db.executemany("DELETE FROM images WHERE id = ?", [(i,) for i in gone])
+                self._db.commit()
+                for i in gone:
+                    self._index.remove(i)
+        return len(gone)
+
+    def similar(self, image: GalleryImage, max_distance: int = 6) -> List[Tuple[int, GalleryImage]]:
+        """Near-duplicates of `image` by Hamming distance, excluding itself."""
+        matches = [(d, i) for d, i in self._index.search(image.phash, max_distance) if i != image.id]
+        if not matches:
+            return []
+        by_id = {g.id: g for g in self._select(
+            f"SELECT * FROM images WHERE id IN ({','.join('?' * len(matches))})", [i for _, i in matches]
+        )}
+        return [(d, by_id[i]) for d, i in matches if i in by_id]
+
+    def thumbnail(self, image: GalleryImage) -> Optional[str]:
+        """Path to a cached JPEG thumbnail, generated on first request.
+
+        Returns None if the source file was moved, deleted or is not an image.
+        """
+        try:
+            st = os.stat(image.path)
+            key = hashlib.sha1(f"{image.path}:{st.st_mtime_ns}:{st.st_size}".encode()).hexdigest()
+            out = os.path.join(self.thumb_dir, f"{key}.jpg")
+            if not os.path.exists(out):
+                os.makedirs(self.thumb_dir, exist_ok=True)
+                with Image.open(image.path) as img:
+                    img = img.convert("RGB")
+                    img.thumbnail(THUMB_SIZE)
+                    img.save(out + ".tmp", "JPEG", quality=85)
+                os.replace(out + ".tmp", out)
+        except (OSError, UnidentifiedImageError, ValueError):
+            return None
+        return out
+
+    def _select(self, sql: str, args) -> List[GalleryImage]:
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [GalleryImage(r[0], r[1], r[2] + (1 << 63), *r[3:]) for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest rendered images into the gallery.")
+    parser.add_argument("paths", nargs="+", help="Image files or directories")
+    parser.add_argument("--preset", default="", help="Preset id the images were rendered with")
+    parser.add_argument("--history-id", default="", help="History entry to link the images to")
+    parser.add_argument("--db", default="gallery.db")
+    args = parser.parse_args()
+
+    gallery = Gallery(args.db)
+    start = time.perf_counter()
+    added, skipped = gallery.ingest(args.paths, args.preset, args.history_id)
+    print(f"Added {added} images, skipped {skipped} unreadable, in {time.perf_counter() - start:.2f}s "
+          f"({gallery.count()} total)")
+
+
+if __name__ == "__main__":
+    main()
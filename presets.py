@@ -0,0 +1,232 @@
+"""
+Preset Catalog
+Style presets and the /imagine command builder, shared by the app and bulk tools.
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional, List
+
+
+# -----------------------------
+# Data Models
+# -----------------------------
+@dataclass
+class StylePreset:
+    id: str
+    name: str
+    category: str
+    icon: str
+    description: str
+    vibe: str
+    base_prompt: str
+    profile: str
+    sref: Optional[str] = None
+    sw: int = 30
+    notes: str = ""
+    tags: List[str] = field(default_factory=list)
+    rating: str = ""
+    # Placeholder image URL - replace with actual style previews
+    thumbnail: str = ""
+
+
+# -----------------------------
+# Preset Database
+# -----------------------------
+# Placeholder images from Unsplash for demo - replace with actual style previews
+PLACEHOLDER_IMAGES = {
+    "action": "https://images.unsplash.com/photo-1612178537253-bccd437b730e?w=300&h=300&fit=crop",
+    "sketch": "https://images.unsplash.com/photo-1604871000636-074fa5117945?w=300&h=300&fit=crop",
+    "cinematic": "https://images.unsplash.com/photo-1536440136628-849c177e76a1?w=300&h=300&fit=crop",
+    "painterly": "https://images.unsplash.com/photo-1579783902614-a3fb3927b6a5?w=300&h=300&fit=crop",
+    "clean": "https://images.unsplash.com/photo-1513364776144-60967b0f800f?w=300&h=300&fit=crop",
+    "horror": "https://images.unsplash.com/photo-1509248961895-b4bfc7da2be3?w=300&h=300&fit=crop",
+}
+
+PRESETS = [
+    # ACTION CATEGORY
+    StylePreset(
+        id="action_manga",
+        name="Action Manga",
+        category="Action",
+        icon="⚡",
+        description="High-energy panels",
+        vibe="Anime character in action, manga panel energy, clean ink/tones",
+        base_prompt="Black and white Manga Panel, perspective, dynamic pose, motion lines, dramatic foreshortening, expressive face, fine details",
+        profile="xp1wzqg",
+        sref="3334207109",
+        sw=30,
+        notes="PERFECT 4/4! Your 'easy button' for action scenes.",
+        tags=["panel", "action", "ink"],
+        rating="4/4 ⭐",
+        thumbnail=PLACEHOLDER_IMAGES["action"]
+    ),
+    StylePreset(
+        id="sketchbook_inoue",
+        name="Inoue Sketch",
+        category="Action",
+        icon="✏️",
+        description="Gritty graphite feel",
+        vibe="Author sketch feel, less glossy, more human linework",
+        base_prompt="In the style of Takehiko Inoue, manga panel, halftone, screentone, sketchbook aesthetic, graphite pencil and ink",
+        profile="xp1wzqg",
+        notes="Great for dramatic character close-ups.",
+        tags=["sketch", "gritty", "pencil"],
+        rating="Favorite",
+        thumbnail=PLACEHOLDER_IMAGES["sketch"]
+    ),
+    StylePreset(
+        id="artgerm_glamour",
+        name="ArtGerm Glam",
+        category="Action",
+        icon="💎",
+        description="Polished comic style",
+        vibe="Magazine-quality finish, flattering lighting",
+        base_prompt="Black and white Manga Panel, perspective, dynamic pose, clean shapes, flattering lighting, In the style of ArtGerm and J Scott Campbell",
+        profile="xp1wzqg",
+        sref="3334207109",
+        sw=35,
+        notes="Use --stylize 1000 for max detail.",
+        tags=["glamour", "comic", "polished"],
+        rating="Powerful",
+        thumbnail=PLACEHOLDER_IMAGES["action"]
+    ),
+    
+    # CINEMATIC CATEGORY
+    StylePreset(
+        id="movie_frame",
+        name="Movie Frame",
+        category="Cinematic",
+        icon="🎬",
+        description="Akira/Ghibli film stills",
+        vibe="Anime film still, story moments, environment-first",
+        base_prompt="Movie frame from Akira directed by Ghibli, wideshot, cinematic composition, atmospheric lighting, manga inspired",
+        profile="xp1wzqg",
+        notes="Rated 5/4! High-budget anime movie feel.",
+        tags=["cinematic", "wideshot", "atmospheric"],
+        rating="5/4 🏆",
+        thumbnail=PLACEHOLDER_IMAGES["cinematic"]
+    ),
+    StylePreset(
+        id="painterly_cover",
+        name="Painterly Cover",
+        category="Cinematic",
+        icon="🎨",
+        description="Emotional book cover vibe",
+        vibe="Cinematic portrait, painterly manga illustration",
+        base_prompt="Painterly manga book cover, emotional atmosphere, detailed rendering, high contrast",
+        profile="xp1wzqg",
+        sref="2180084546",
+        notes="Best sref for cover art and fantasy portraits.",
+        tags=["cover", "painterly", "emotional"],
+        rating="Best SREF",
+        thumbnail=PLACEHOLDER_IMAGES["painterly"]
+    ),
+    StylePreset(
+        id="wlop_charming",
+        name="WLOP Fantasy",
+        category="Cinematic",
+        icon="✨",
+        description="High-end character design",
+        vibe="Charming aesthetics, glamorous anime style",
+        base_prompt="In the style of WLOP and SakiMiCham, charming girl, glamorous anime artstyle, cinematic, dramatic lights",
+        profile="xp1wzqg",
+        sref="2180084546",
+        notes="Excellent for fantasy character concepts.",
+        tags=["fantasy", "charming", "character"],
+        rating="High Level",
+        thumbnail=PLACEHOLDER_IMAGES["painterly"]
+    ),
+    
+    # GRAPHIC CATEGORY
+    StylePreset(
+        id="single_line",
+        name="Single-Line",
+        category="Graphic",
+        icon="〰️",
+        description="Crisp, minimal lines",
+        vibe="Simplified anime look, graphic clarity",
+        base_prompt="Manga inspired, black and white, crisp single-line weight sketch, clean graphic style",
+        profile="xp1wzqg",
+        sref="3599646714::1",
+        sw=35,
+        notes="Excellent single line weight. Clean and minimal.",
+        tags=["clean", "minimal", "line"],
+        rating="Excellent",
+        thumbnail=PLACEHOLDER_IMAGES["clean"]
+    ),
+    StylePreset(
+        id="likeness_line",
+        name="Likeness Line",
+        category="Graphic",
+        icon="👤",
+        description="Better face fidelity",
+        vibe="Clean line with character likeness",
+        base_prompt="Black and white manga panel, crisp line",
+        profile="xp1wzqg",
+        sref="2033610796::1",
+        notes="Does well with likeness even without cref.",
+        tags=["likeness", "clean", "fidelity"],
+        rating="Good Likeness",
+        thumbnail=PLACEHOLDER_IMAGES["clean"]
+    ),
+    StylePreset(
+        id="horror_cover",
+        name="Horror/Dark",
+        category="Graphic",
+        icon="👁️",
+        description="Creepy, unsettling mood",
+        vibe="Dark fantasy, psychological horror",
+        base_prompt="In the style of Junji Ito, Gege Akutami, Kazuma Kaneko, manga cover, eerie mood, high-contrast black and white, unsettling detail",
+        profile="xp1wzqg",
+        notes="Really creepy... worth experimenting!",
+        tags=["horror", "creepy", "dark"],
+        rating="Banger 🔥",
+        thumbnail=PLACEHOLDER_IMAGES["horror"]
+    ),
+]
+
+# Quick chooser mapping
+QUICK_MAP = {
+    "⚡ Action Panel": "action_manga",
+    "🎬 Movie Frame": "movie_frame", 
+    "📖 Book Cover": "painterly_cover",
+    "✏️ Sketchy": "sketchbook_inoue",
+    "〰️ Clean Line": "single_line",
+    "👁️ Horror": "horror_cover",
+}
+
+CATEGORIES = ["Action", "Cinematic", "Graphic"]
+
+
+# -----------------------------
+# Helper Functions
+# -----------------------------
+def get_preset(preset_id: str) -> StylePreset:
+    return next((p for p in PRESETS if p.id == preset_id), PRESETS[0])
+
+def build_command(preset: StylePreset, subject: str, scene: str, sw: int, stylize: int, ar: str, cref: str, cw: int, sexy_mode: bool) -> str:
+    """Build the final /imagine command."""
+    parts = [preset.base_prompt]
+    if subject.strip():
+        parts.append(subject.strip())
+    if scene.strip():
+        parts.append(scene.strip())
+    prompt = ", ".join(parts)
+    
+    profile = "1vkrwxy elkd3fo pjmf3zg ulvca2i" if sexy_mode else preset.profile
+    
+    params = [f"--niji 6", f"--profile {profile}"]
+    if preset.sref:
+        params.append(f"--sref {preset.sref}")
+    params.append(f"--sw {sw}")
+    params.append(f"--stylize {stylize}")
+    
+    if cref.strip():
+        params.append(f"--cref {cref.strip()}")
+        params.append(f"--cw {cw}")
+    
+    if ar.strip():
+        ar_val = ar.strip().replace("--ar ", "")
+        params.append(f"--ar {ar_val}")
+    
+    return f"/imagine prompt: {prompt} {' '.join(params)}"
@@ -0,0 +1,263 @@
+"""
+Session State Backends
+Keeps user state outside the Streamlit process so any replica can serve any session.
+
+Features:
+- Pluggable backends: in-process, SQLite, Redis-compatible (redis, fakeredis, Valkey)
+- Sessions keyed by an id carried in the URL, not the Streamlit session
+- Per-session write-through cache; one batched write per rerun, changed keys only
+- Append-only lists (history) so tabs and replicas sharing a session never
+  overwrite each other's entries
+
+The session id travels in the URL (?sid=) and works like a bearer token:
+anyone holding the link can read and change that session's state. Treat
+shared links accordingly; deployments needing privacy should put the app
+behind authentication.
+"""
+
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+# Optional Redis client
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class StateBackend:
+    """Stores a JSON-serialisable dict and append-only lists per session id."""
+
+    def load(self, sid: str) -> Dict:
+        raise NotImplementedError
+
+    def save(self, sid: str, changes: Dict):
+        """Write only the given keys; other keys of the session are left alone."""
+        raise NotImplementedError
+
+    def append(self, sid: str, key: str, items: List, expire: bool = True):
+        """Append to a list; concurrent appends from other writers are all kept.
+
+        `expire=False` exempts the list from idle-session expiry, for shared
+        data that is not tied to one session.
+        """
+        raise NotImplementedError
+
+    def read_list(self, sid: str, key: str, start: int = 0, limit: Optional[int] = None) -> List:
+        """Items from position `start`, at most `limit` of them (all if None)."""
+        raise NotImplementedError
+
+    def list_len(self, sid: str, key: str) -> int:
+        raise NotImplementedError
+
+    def clear_list(self, sid: str, key: str):
+        raise NotImplementedError
+
+
+class MemoryBackend(StateBackend):
+    """Process-local; survives reconnects but not restarts or other replicas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, str]] = {}
+        self._lists: Dict[tuple, List[str]] = {}
+
+    def load(self, sid: str) -> Dict:
+        with self._lock:
+            return {k: json.loads(v) for k, v in self._data.get(sid, {}).items()}
+
+    def save(self, sid: str, changes: Dict):
+        with self._lock:
+            self._data.setdefault(sid, {}).update({k: json.dumps(v) for k, v in changes.items()})
+
+    def append(self, sid: str, key: str, items: List, expire: bool = True):
+        with self._lock:
+            self._lists.setdefault((sid, key), []).extend(json.dumps(i) for i in items)
+
+    def read_list(self, sid: str, key: str, start: int = 0, limit: Optional[int] = None) -> List:
+        end = None if limit is None else start + limit
+        with self._lock:
+            return [json.loads(v) for v in self._lists.get((sid, key), [])[start:end]]
+
+    def list_len(self, sid: str, key: str) -> int:
+        with self._lock:
+            return len(self._lists.get((sid, key), []))
+
+    def clear_list(self, sid: str, key: str):
+        with self._lock:
+            self._lists.pop((sid, key), None)
+
+
+class SQLiteBackend(StateBackend):
+    """Shared file for replicas on one host (or a shared volume)."""
+
+    def __init__(self, path: str = "state.db"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets replicas read while another one writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS state (sid TEXT, key TEXT, value TEXT NOT NULL, PRIMARY KEY (sid, key))"
+        )
+        # One row per list item; seq preserves insertion order across writers
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS lists (seq INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT, key TEXT, value TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS lists_sid_key ON lists (sid, key, seq)")
+        self._db.commit()
+
+    def load(self, sid: str) -> Dict:
+        with self._lock:
+            rows = self._db.execute("SELECT key, value FROM state WHERE sid = ?", (sid,)).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+    def save(self, sid: str, changes: Dict):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO state VALUES (?, ?, ?)",
+                [(sid, k, json.dumps(v)) for k, v in changes.items()],
+            )
+            self._db.commit()
+
+    def append(self, sid: str, key: str, items: List, expire: bool = True):
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO lists (sid, key, value) VALUES (?, ?, ?)",
+                [(sid, key, json.dumps(i)) for i in items],
+            )
+            self._db.commit()
+
+    def read_list(self, sid: str, key: str, start: int = 0, limit: Optional[int] = None) -> List:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT value FROM lists WHERE sid = ? AND key = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (sid, key, -1 if limit is None else limit, start),
+            ).fetchall()
+        return [json.loads(v) for (v,) in rows]
+
+    def list_len(self, sid: str, key: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM lists WHERE sid = ? AND key = ?", (sid, key)).fetchone()[0]
+
+    def clear_list(self, sid: str, key: str):
+        with self._lock:
+            self._db.execute("DELETE FROM lists WHERE sid = ? AND key = ?", (sid, key))
+            self._db.commit()
+
+
+class RedisBackend(StateBackend):
+    """One hash per session; idle sessions expire after `ttl` seconds (lists appended with expire=False don't)."""
+
+    def __init__(self, client, ttl: int = 30 * 24 * 3600, prefix: str = "niji:state:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBackend":
+        if not HAS_REDIS:
+            raise RuntimeError("The redis package is required for redis:// state backends")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def load(self, sid: str) -> Dict:
+        raw = self.client.hgetall(self.prefix + sid)
+        return {k.decode(): json.loads(v) for k, v in raw.items()}
+
+    def save(self, sid: str, changes: Dict):
+        key = self.prefix + sid
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping={k: json.dumps(v) for k, v in changes.items()})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def append(self, sid: str, key: str, items: List, expire: bool = True):
+        name = f"{self.prefix}{sid}:{key}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(name, *(json.dumps(i) for i in items))
+        if expire:
+            pipe.expire(name, self.ttl)
+        else:
+            pipe.persist(name)
+        pipe.execute()
+
+    def read_list(self, sid: str, key: str, start: int = 0, limit: Optional[int] = None) -> List:
+        end = -1 if limit is None else start + limit - 1
+        return [json.loads(v) for v in self.client.lrange(f"{self.prefix}{sid}:{key}", start, end)]
+
+    def list_len(self, sid: str, key: str) -> int:
+        return self.client.llen(f"{self.prefix}{sid}:{key}")
+
+    def clear_list(self, sid: str, key: str):
+        self.client.delete(f"{self.prefix}{sid}:{key}")
+
+
+def backend_from_url(url: str) -> StateBackend:
+    """`memory://`, `sqlite:///path/to/state.db` or `redis://host:port/db`."""
+    if not url or url.startswith("memory:"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend.from_url(url)
+    raise ValueError(f"Unknown state backend: {url}")
+
+
+# -----------------------------
+# Session Cache
+# -----------------------------
+class SessionState:
+    """Cached view of one session.
+
+    Reads come from the copy loaded on first access. `flush` diffs the given
+    values against what was last written and sends the changes in one call,
+    so a rerun costs at most one backend write.
+    """
+
+    def __init__(self, backend: StateBackend, sid: str):
+        self.backend = backend
+        self.sid = sid
+        self._saved: Dict[str, str] = {}
+        self.values: Dict = {}
+
+    def load(self) -> Dict:
+        self.values = self.backend.load(self.sid)
+        self._saved = {k: json.dumps(v) for k, v in self.values.items()}
+        return self.values
+
+    def flush(self, values: Dict) -> Optional[Dict]:
+        """Persist changed keys of `values`. Returns the changes written, if any."""
+        encoded = {k: json.dumps(v) for k, v in values.items()}
+        changes = {k: values[k] for k, v in encoded.items() if self._saved.get(k) != v}
+        if changes:
+            self.backend.save(self.sid, changes)
+            self._saved.update({k: encoded[k] for k in changes})
+        self.values.update(values)
+        return changes or None
+
+    def append(self, key: str, items: List):
+        """Append-only write: never replaces entries added by other tabs or replicas."""
+        if items:
+            self.backend.append(self.sid, key, items)
+
+    def sync_list(self, key: str, local: List) -> List:
+        """`local` extended with entries appended elsewhere; re-read in full if the list was cleared.
+
+        Length alone can't tell: after a clear, other writers may have appended
+        past `len(local)` again. So the read starts at our last entry and only
+        extends `local` if the backend still holds that entry there.
+        """
+        if not local:
+            return self.backend.read_list(self.sid, key)
+        tail = self.backend.read_list(self.sid, key, start=len(local) - 1)
+        if tail and tail[0] == local[-1]:
+            return local + tail[1:]
+        return self.backend.read_list(self.sid, key)
+
+    def clear_list(self, key: str):
+        self.backend.clear_list(self.sid, key)
@@ -8,12 +8,22 @@ Features:
 - Randomizer for creative inspiration
 - Full micro-tuning controls
 - Command history
+- Async submission to a render backend (set NIJI_RENDER_URL)
+- Gallery of rendered images with near-duplicate search
+- External session state (set NIJI_STATE_BACKEND) for multi-replica deploys
+- Usage analytics from pre-aggregated history columns
 """
 
+import html
+import json
+import logging
+import os
+import threading
+import time
+import uuid
 import streamlit as st
+import streamlit.components.v1 as components
 import random
-from dataclasses import dataclass, field
-from typing import Optional, List
 
 # Try to import image selection component (optional)
 try:
@@ -22,6 +32,30 @@ try:
 except ImportError:
     HAS_IMAGE_SELECT = False
 
+from analytics import HistoryColumns, STORE_KEY, STORE_SID
+from dispatcher import Dispatcher, HttpBackend, JobStore, TERMINAL
+from gallery import Gallery, within_root
+from presets import StylePreset, PRESETS, QUICK_MAP, CATEGORIES, get_preset, build_command
+from state import SessionState, backend_from_url
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Render backend endpoint; submission UI is hidden when unset
+RENDER_URL = os.environ.get("NIJI_RENDER_URL", "")
+
+# memory://, sqlite:///state.db or redis://host:6379/0
+STATE_URL = os.environ.get("NIJI_STATE_BACKEND", "memory://")
+# User state that follows a session across replicas and restarts. History is
+# kept separately as an append-only list so concurrent tabs never clobber it.
+PERSISTED_KEYS = ("selected_id", "sexy_mode", "subject", "scene")
+
+# The gallery is shared by every session, so ingest only reads images under this directory
+GALLERY_ROOT = os.path.realpath(os.environ.get("NIJI_GALLERY_ROOT", os.path.join(APP_DIR, "renders")))
+
+# Set NIJI_PERF=1 to show reruns and server CPU per session in the sidebar
+PERF = os.environ.get("NIJI_PERF") == "1"
+_script_cpu_start = time.thread_time()
+
 # -----------------------------
 # Page Config
 # -----------------------------
@@ -35,535 +69,83 @@ st.set_page_config(
 # -----------------------------
 # Custom CSS - Dark Manga Theme
 # -----------------------------
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@400;500;600;700&family=JetBrains+Mono:wght@400;500&display=swap');
-    
-    :root {
-        --bg-dark: #0a0a0f;
-        --bg-card: #14141f;
-        --bg-card-hover: #1a1a2a;
-        --accent: #e94560;
-        --accent-secondary: #6b5ce7;
-        --text-primary: #ffffff;
-        --text-secondary: #9999bb;
-        --border: #2a2a40;
-    }
-    
-    .stApp {
-        background: linear-gradient(180deg, var(--bg-dark) 0%, #12121f 100%);
-    }
-    
-    /* Typography */
-    h1, h2, h3, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {
-        font-family: 'Outfit', sans-serif !important;
-        font-weight: 700 !important;
-    }
-    
-    h1 {
-        background: linear-gradient(90deg, #e94560 0%, #ff8a80 50%, #6b5ce7 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        background-clip: text;
-        font-size: 2.5rem !important;
-    }
-    
-    /* Card containers */
-    .preset-grid {
-        display: grid;
-        grid-template-columns: repeat(auto-fit, minmax(180px, 1fr));
-        gap: 1rem;
-        margin: 1rem 0;
-    }
-    
-    .preset-card {
-        background: var(--bg-card);
-        border: 2px solid var(--border);
-        border-radius: 16px;
-        padding: 1rem;
-        cursor: pointer;
-        transition: all 0.25s cubic-bezier(0.4, 0, 0.2, 1);
-        position: relative;
-        overflow: hidden;
-    }
-    
-    .preset-card::before {
-        content: '';
-        position: absolute;
-        top: 0;
-        left: 0;
-        right: 0;
-        height: 4px;
-        background: linear-gradient(90deg, var(--accent), var(--accent-secondary));
-        opacity: 0;
-        transition: opacity 0.25s ease;
-    }
-    
-    .preset-card:hover {
-        border-color: var(--accent);
-        transform: translateY(-4px);
-        box-shadow: 0 12px 40px rgba(233, 69, 96, 0.2);
-    }
-    
-    .preset-card:hover::before {
-        opacity: 1;
-    }
-    
-    .preset-card.active {
-        border-color: var(--accent);
-        background: linear-gradient(145deg, #1a1525 0%, #201530 100%);
-        box-shadow: 0 0 30px rgba(233, 69, 96, 0.3);
-    }
-    
-    .preset-card.active::before {
-        opacity: 1;
-    }
-    
-    .preset-card .icon {
-        font-size: 2rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    .preset-card h4 {
-        font-family: 'Outfit', sans-serif;
-        font-weight: 600;
-        color: var(--text-primary);
-        margin: 0 0 0.3rem 0;
-        font-size: 1rem;
-    }
-    
-    .preset-card p {
-        color: var(--text-secondary);
-        font-size: 0.8rem;
-        margin: 0;
-        line-height: 1.3;
-    }
-    
-    .rating-badge {
-        display: inline-block;
-        background: rgba(233, 69, 96, 0.15);
-        color: var(--accent);
-        padding: 0.15rem 0.5rem;
-        border-radius: 12px;
-        font-size: 0.7rem;
-        font-weight: 600;
-        margin-top: 0.5rem;
-    }
-    
-    /* Command output */
-    .command-output {
-        background: #080810;
-        border: 1px solid var(--accent);
-        border-radius: 12px;
-        padding: 1.25rem;
-        margin: 1rem 0;
-        font-family: 'JetBrains Mono', monospace;
-        font-size: 0.9rem;
-        color: #00ff88;
-        line-height: 1.7;
-        word-break: break-word;
-        position: relative;
-    }
-    
-    .command-output::before {
-        content: '>';
-        position: absolute;
-        left: 1rem;
-        top: 1.25rem;
-        color: var(--accent);
-        font-weight: bold;
-    }
-    
-    /* Quick chooser pills */
-    .quick-pills {
-        display: flex;
-        flex-wrap: wrap;
-        gap: 0.5rem;
-        margin: 1rem 0;
-    }
-    
-    .quick-pill {
-        background: linear-gradient(135deg, var(--bg-card) 0%, var(--bg-card-hover) 100%);
-        border: 1px solid var(--border);
-        color: var(--text-secondary);
-        padding: 0.5rem 1rem;
-        border-radius: 25px;
-        font-size: 0.85rem;
-        font-family: 'Outfit', sans-serif;
-        cursor: pointer;
-        transition: all 0.2s ease;
-    }
-    
-    .quick-pill:hover {
-        border-color: var(--accent);
-        color: var(--text-primary);
-        background: linear-gradient(135deg, #1a1525 0%, #251535 100%);
-    }
-    
-    /* Info panel */
-    .info-panel {
-        background: linear-gradient(135deg, rgba(107, 92, 231, 0.1) 0%, rgba(233, 69, 96, 0.05) 100%);
-        border-left: 3px solid var(--accent-secondary);
-        border-radius: 0 12px 12px 0;
-        padding: 1rem 1.25rem;
-        margin: 1rem 0;
-    }
-    
-    .info-panel h5 {
-        color: var(--text-primary);
-        margin: 0 0 0.25rem 0;
-        font-size: 1.1rem;
-    }
-    
-    .info-panel p {
-        color: var(--text-secondary);
-        margin: 0;
-        font-size: 0.9rem;
-    }
-    
-    /* Section headers */
-    .section-header {
-        display: flex;
-        align-items: center;
-        gap: 0.75rem;
-        margin: 1.5rem 0 1rem 0;
-    }
-    
-    .section-header .icon {
-        background: linear-gradient(135deg, var(--accent) 0%, var(--accent-secondary) 100%);
-        width: 36px;
-        height: 36px;
-        border-radius: 10px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-size: 1.1rem;
-    }
-    
-    .section-header h3 {
-        margin: 0;
-        font-size: 1.25rem;
-    }
-    
-    /* Divider */
-    .divider {
-        height: 1px;
-        background: linear-gradient(90deg, transparent 0%, var(--border) 50%, transparent 100%);
-        margin: 2rem 0;
-    }
-    
-    /* Button overrides */
-    .stButton > button {
-        font-family: 'Outfit', sans-serif;
-        font-weight: 500;
-        border-radius: 10px;
-        transition: all 0.2s ease;
-    }
-    
-    .stButton > button[kind="primary"] {
-        background: linear-gradient(135deg, var(--accent) 0%, #ff6b7a 100%);
-        border: none;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 20px rgba(233, 69, 96, 0.3);
-    }
-    
-    /* Input styling */
-    .stTextInput input {
-        background: var(--bg-card) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 10px !important;
-        color: var(--text-primary) !important;
-        font-family: 'Outfit', sans-serif !important;
-    }
-    
-    .stTextInput input:focus {
-        border-color: var(--accent) !important;
-        box-shadow: 0 0 0 2px rgba(233, 69, 96, 0.2) !important;
-    }
-    
-    /* Slider */
-    .stSlider [data-baseweb="slider"] [data-testid="stThumbValue"] {
-        color: var(--accent);
-    }
-    
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        background: transparent;
-        gap: 0.5rem;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        background: var(--bg-card);
-        border: 1px solid var(--border);
-        border-radius: 10px;
-        color: var(--text-secondary);
-        font-family: 'Outfit', sans-serif;
-        padding: 0.75rem 1.25rem;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background: linear-gradient(135deg, #1a1525 0%, #201530 100%);
-        border-color: var(--accent);
-        color: var(--text-primary);
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader {
-        background: var(--bg-card);
-        border-radius: 10px;
-        font-family: 'Outfit', sans-serif;
-    }
-    
-    /* Hide default elements */
-    #MainMenu, footer, header {visibility: hidden;}
-    
-    /* Thumbnail grid for images */
-    .thumb-grid {
-        display: grid;
-        grid-template-columns: repeat(3, 1fr);
-        gap: 0.75rem;
-        margin: 1rem 0;
-    }
-    
-    .thumb-item {
-        aspect-ratio: 1;
-        background: var(--bg-card);
-        border: 2px solid var(--border);
-        border-radius: 12px;
-        overflow: hidden;
-        cursor: pointer;
-        transition: all 0.2s ease;
-        position: relative;
-    }
-    
-    .thumb-item:hover {
-        border-color: var(--accent);
-        transform: scale(1.03);
-    }
-    
-    .thumb-item.selected {
-        border-color: var(--accent);
-        box-shadow: 0 0 20px rgba(233, 69, 96, 0.4);
-    }
-    
-    .thumb-item img {
-        width: 100%;
-        height: 100%;
-        object-fit: cover;
-    }
-    
-    .thumb-label {
-        position: absolute;
-        bottom: 0;
-        left: 0;
-        right: 0;
-        background: linear-gradient(transparent, rgba(0,0,0,0.8));
-        padding: 0.5rem;
-        font-size: 0.75rem;
-        color: white;
-        text-align: center;
-    }
-</style>
-""", unsafe_allow_html=True)
+THEME_MANIFEST = os.path.join(APP_DIR, "static", "manifest.json")
+# Used only until build_assets.py has produced self-hosted fonts (the app builds them on first start)
+GOOGLE_FONTS_IMPORT = "@import url('https://fonts.googleapis.com/css2?family=Outfit:wght@400;500;600;700&family=JetBrains+Mono:wght@400;500&display=swap');"
 
+@st.cache_data
+def load_theme_css(manifest_mtime: float) -> str:
+    """Minified, fingerprinted theme from build_assets.py, or the source plus Google Fonts if not built.
 
-# -----------------------------
-# Data Models
-# -----------------------------
-@dataclass
-class StylePreset:
-    id: str
-    name: str
-    category: str
-    icon: str
-    description: str
-    vibe: str
-    base_prompt: str
-    profile: str
-    sref: Optional[str] = None
-    sw: int = 30
-    notes: str = ""
-    tags: List[str] = field(default_factory=list)
-    rating: str = ""
-    # Placeholder image URL - replace with actual style previews
-    thumbnail: str = ""
+    `manifest_mtime` is only a cache key, so a rebuild is picked up without a restart.
+    """
+    if manifest_mtime:
+        with open(THEME_MANIFEST) as f:
+            path = os.path.join(APP_DIR, "static", json.load(f)["theme"])
+        with open(path) as f:
+            return f.read()
+    logging.getLogger(__name__).warning(
+        "static/manifest.json not found: loading fonts from Google Fonts until the asset build finishes."
+    )
+    with open(os.path.join(APP_DIR, "assets", "theme.css")) as f:
+        return GOOGLE_FONTS_IMPORT + "\n" + f.read()
 
+@st.cache_resource
+def start_asset_build():
+    """Build missing self-hosted fonts once per process, on a thread so the first page isn't held up.
 
-# -----------------------------
-# Preset Database
-# -----------------------------
-# Placeholder images from Unsplash for demo - replace with actual style previews
-PLACEHOLDER_IMAGES = {
-    "action": "https://images.unsplash.com/photo-1612178537253-bccd437b730e?w=300&h=300&fit=crop",
-    "sketch": "https://images.unsplash.com/photo-1604871000636-074fa5117945?w=300&h=300&fit=crop",
-    "cinematic": "https://images.unsplash.com/photo-1536440136628-849c177e76a1?w=300&h=300&fit=crop",
-    "painterly": "https://images.unsplash.com/photo-1579783902614-a3fb3927b6a5?w=300&h=300&fit=crop",
-    "clean": "https://images.unsplash.com/photo-1513364776144-60967b0f800f?w=300&h=300&fit=crop",
-    "horror": "https://images.unsplash.com/photo-1509248961895-b4bfc7da2be3?w=300&h=300&fit=crop",
-}
-
-PRESETS = [
-    # ACTION CATEGORY
-    StylePreset(
-        id="action_manga",
-        name="Action Manga",
-        category="Action",
-        icon="⚡",
-        description="High-energy panels",
-        vibe="Anime character in action, manga panel energy, clean ink/tones",
-        base_prompt="Black and white Manga Panel, perspective, dynamic pose, motion lines, dramatic foreshortening, expressive face, fine details",
-        profile="xp1wzqg",
-        sref="3334207109",
-        sw=30,
-        notes="PERFECT 4/4! Your 'easy button' for action scenes.",
-        tags=["panel", "action", "ink"],
-        rating="4/4 ⭐",
-        thumbnail=PLACEHOLDER_IMAGES["action"]
-    ),
-    StylePreset(
-        id="sketchbook_inoue",
-        name="Inoue Sketch",
-        category="Action",
-        icon="✏️",
-        description="Gritty graphite feel",
-        vibe="Author sketch feel, less glossy, more human linework",
-        base_prompt="In the style of Takehiko Inoue, manga panel, halftone, screentone, sketchbook aesthetic, graphite pencil and ink",
-        profile="xp1wzqg",
-        notes="Great for dramatic character close-ups.",
-        tags=["sketch", "gritty", "pencil"],
-        rating="Favorite",
-        thumbnail=PLACEHOLDER_IMAGES["sketch"]
-    ),
-    StylePreset(
-        id="artgerm_glamour",
-        name="ArtGerm Glam",
-        category="Action",
-        icon="💎",
-        description="Polished comic style",
-        vibe="Magazine-quality finish, flattering lighting",
-        base_prompt="Black and white Manga Panel, perspective, dynamic pose, clean shapes, flattering lighting, In the style of ArtGerm and J Scott Campbell",
-        profile="xp1wzqg",
-        sref="3334207109",
-        sw=35,
-        notes="Use --stylize 1000 for max detail.",
-        tags=["glamour", "comic", "polished"],
-        rating="Powerful",
-        thumbnail=PLACEHOLDER_IMAGES["action"]
-    ),
-    
-    # CINEMATIC CATEGORY
-    StylePreset(
-        id="movie_frame",
-        name="Movie Frame",
-        category="Cinematic",
-        icon="🎬",
-        description="Akira/Ghibli film stills",
-        vibe="Anime film still, story moments, environment-first",
-        base_prompt="Movie frame from Akira directed by Ghibli, wideshot, cinematic composition, atmospheric lighting, manga inspired",
-        profile="xp1wzqg",
-        notes="Rated 5/4! High-budget anime movie feel.",
-        tags=["cinematic", "wideshot", "atmospheric"],
-        rating="5/4 🏆",
-        thumbnail=PLACEHOLDER_IMAGES["cinematic"]
-    ),
-    StylePreset(
-        id="painterly_cover",
-        name="Painterly Cover",
-        category="Cinematic",
-        icon="🎨",
-        description="Emotional book cover vibe",
-        vibe="Cinematic portrait, painterly manga illustration",
-        base_prompt="Painterly manga book cover, emotional atmosphere, detailed rendering, high contrast",
-        profile="xp1wzqg",
-        sref="2180084546",
-        notes="Best sref for cover art and fantasy portraits.",
-        tags=["cover", "painterly", "emotional"],
-        rating="Best SREF",
-        thumbnail=PLACEHOLDER_IMAGES["painterly"]
-    ),
-    StylePreset(
-        id="wlop_charming",
-        name="WLOP Fantasy",
-        category="Cinematic",
-        icon="✨",
-        description="High-end character design",
-        vibe="Charming aesthetics, glamorous anime style",
-        base_prompt="In the style of WLOP and SakiMiCham, charming girl, glamorous anime artstyle, cinematic, dramatic lights",
-        profile="xp1wzqg",
-        sref="2180084546",
-        notes="Excellent for fantasy character concepts.",
-        tags=["fantasy", "charming", "character"],
-        rating="High Level",
-        thumbnail=PLACEHOLDER_IMAGES["painterly"]
-    ),
-    
-    # GRAPHIC CATEGORY
-    StylePreset(
-        id="single_line",
-        name="Single-Line",
-        category="Graphic",
-        icon="〰️",
-        description="Crisp, minimal lines",
-        vibe="Simplified anime look, graphic clarity",
-        base_prompt="Manga inspired, black and white, crisp single-line weight sketch, clean graphic style",
-        profile="xp1wzqg",
-        sref="3599646714::1",
-        sw=35,
-        notes="Excellent single line weight. Clean and minimal.",
-        tags=["clean", "minimal", "line"],
-        rating="Excellent",
-        thumbnail=PLACEHOLDER_IMAGES["clean"]
-    ),
-    StylePreset(
-        id="likeness_line",
-        name="Likeness Line",
-        category="Graphic",
-        icon="👤",
-        description="Better face fidelity",
-        vibe="Clean line with character likeness",
-        base_prompt="Black and white manga panel, crisp line",
-        profile="xp1wzqg",
-        sref="2033610796::1",
-        notes="Does well with likeness even without cref.",
-        tags=["likeness", "clean", "fidelity"],
-        rating="Good Likeness",
-        thumbnail=PLACEHOLDER_IMAGES["clean"]
-    ),
-    StylePreset(
-        id="horror_cover",
-        name="Horror/Dark",
-        category="Graphic",
-        icon="👁️",
-        description="Creepy, unsettling mood",
-        vibe="Dark fantasy, psychological horror",
-        base_prompt="In the style of Junji Ito, Gege Akutami, Kazuma Kaneko, manga cover, eerie mood, high-contrast black and white, unsettling detail",
-        profile="xp1wzqg",
-        notes="Really creepy... worth experimenting!",
-        tags=["horror", "creepy", "dark"],
-        rating="Banger 🔥",
-        thumbnail=PLACEHOLDER_IMAGES["horror"]
-    ),
-]
-
-# Quick chooser mapping
-QUICK_MAP = {
-    "⚡ Action Panel": "action_manga",
-    "🎬 Movie Frame": "movie_frame", 
-    "📖 Book Cover": "painterly_cover",
-    "✏️ Sketchy": "sketchbook_inoue",
-    "〰️ Clean Line": "single_line",
-    "👁️ Horror": "horror_cover",
-}
-
-CATEGORIES = ["Action", "Cinematic", "Graphic"]
+    The next run after it finishes sees the new manifest mtime and switches over.
+    """
+    def run():
+        try:
+            import build_assets
+            build_assets.build()
+        except Exception as e:
+            logging.getLogger(__name__).warning(
+                "Asset build failed (%r); keeping Google Fonts. Run build_assets.py with the fonts in assets/fonts/.", e
+            )
+    threading.Thread(target=run, daemon=True, name="asset-build").start()
+
+if not os.path.exists(THEME_MANIFEST):
+    start_asset_build()
+
+st.markdown(
+    f"<style>{load_theme_css(os.path.getmtime(THEME_MANIFEST) if os.path.exists(THEME_MANIFEST) else 0.0)}</style>",
+    unsafe_allow_html=True,
+)
 
 
 # -----------------------------
 # Session State
 # -----------------------------
+@st.cache_resource
+def get_state_backend():
+    return backend_from_url(STATE_URL)
+
+@st.cache_resource
+def get_analytics() -> HistoryColumns:
+    """Saves from every session and replica, rebuilt from the state backend on a thread at startup."""
+    columns = HistoryColumns()
+
+    def load():
+        try:
+            columns.sync(get_state_backend())
+        except Exception as e:
+            # Later runs retry through their own sync calls
+            logging.getLogger(__name__).warning("Loading analytics failed: %r", e)
+    threading.Thread(target=load, daemon=True, name="analytics-load").start()
+    return columns
+
+# Sessions are identified by ?sid= rather than the Streamlit session, so a
+# reload on any replica picks the user's state back up. The sid is effectively
+# a bearer token: anyone with the URL can read and change that session.
+if "state_store" not in st.session_state:
+    sid = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = sid
+    st.session_state.state_store = SessionState(get_state_backend(), sid)
+    loaded = st.session_state.state_store.load()
+    st.session_state.update({k: v for k, v in loaded.items() if k in PERSISTED_KEYS})
+
 if "selected_id" not in st.session_state:
     st.session_state.selected_id = "action_manga"
 if "history" not in st.session_state:
@@ -574,14 +156,28 @@ if "subject" not in st.session_state:
     st.session_state.subject = ""
 if "scene" not in st.session_state:
     st.session_state.scene = ""
+if "gallery_page" not in st.session_state:
+    st.session_state.gallery_page = 0
+if "similar_to" not in st.session_state:
+    st.session_state.similar_to = None
+if "pending_saves" not in st.session_state:
+    st.session_state.pending_saves = []
+if "perf" not in st.session_state:
+    st.session_state.perf = {"app_runs": 0, "app_cpu": 0.0, "fragment_runs": 0, "fragment_cpu": 0.0}
+
+# Saves are appended to the backend by the action bar fragment and picked up
+# here, together with saves from other tabs or replicas, on the next full run.
+st.session_state.history = st.session_state.state_store.sync_list("history", st.session_state.history)
+# Our own saves show up at once; other replicas' saves within a few seconds
+get_analytics().sync(get_state_backend(), min_interval=0 if st.session_state.pending_saves else 5.0)
+st.session_state.pending_saves = []
+
+GALLERY_PAGE_SIZE = 12
 
 
 # -----------------------------
 # Helper Functions
 # -----------------------------
-def get_preset(preset_id: str) -> StylePreset:
-    return next((p for p in PRESETS if p.id == preset_id), PRESETS[0])
-
 def select_preset(preset_id: str):
     st.session_state.selected_id = preset_id
 
@@ -600,32 +196,101 @@ def randomize():
     ]
     st.session_state.subject = random.choice(subjects)
 
-def build_command(preset: StylePreset, subject: str, scene: str, sw: int, stylize: int, ar: str, cref: str, cw: int, sexy_mode: bool) -> str:
-    """Build the final /imagine command."""
-    parts = [preset.base_prompt]
-    if subject.strip():
-        parts.append(subject.strip())
-    if scene.strip():
-        parts.append(scene.strip())
-    prompt = ", ".join(parts)
-    
-    profile = "1vkrwxy elkd3fo pjmf3zg ulvca2i" if sexy_mode else preset.profile
-    
-    params = [f"--niji 6", f"--profile {profile}"]
-    if preset.sref:
-        params.append(f"--sref {preset.sref}")
-    params.append(f"--sw {sw}")
-    params.append(f"--stylize {stylize}")
-    
-    if cref.strip():
-        params.append(f"--cref {cref.strip()}")
-        params.append(f"--cw {cw}")
-    
-    if ar.strip():
-        ar_val = ar.strip().replace("--ar ", "")
-        params.append(f"--ar {ar_val}")
-    
-    return f"/imagine prompt: {prompt} {' '.join(params)}"
+@st.cache_resource
+def get_dispatcher() -> Dispatcher:
+    """One dispatcher per server process; resumes any jobs left over from a crash."""
+    dispatcher = Dispatcher(JobStore(os.environ.get("NIJI_JOBS_DB", "render_jobs.db")), HttpBackend(RENDER_URL))
+    dispatcher.start()
+    return dispatcher
+
+@st.cache_resource
+def get_gallery() -> Gallery:
+    """Shared gallery; loading it rebuilds the hash index once per server process."""
+    return Gallery(os.environ.get("NIJI_GALLERY_DB", "gallery.db"))
+
+def persist_state():
+    """One batched backend write per run, containing only keys that changed."""
+    st.session_state.state_store.flush({k: st.session_state[k] for k in PERSISTED_KEYS})
+
+def submit_render(cmd: str, preset_id: str = ""):
+    try:
+        get_dispatcher().enqueue(cmd, preset_id)
+    except RuntimeError as e:
+        st.toast(f"Render queue unavailable: {e}", icon="⚠️")
+        return
+    st.toast("Queued for rendering!", icon="🚀")
+
+def copy_button(text: str, label: str = "📋 Copy"):
+    """Clipboard button that runs entirely in the browser - no script rerun."""
+    payload = json.dumps(text).replace("</", "<\\/")
+    markup = f"""
+    <button id="copy" style="width:100%;height:38px;border-radius:10px;cursor:pointer;
+        background:#14141f;color:#fff;border:1px solid #2a2a40;font:500 14px 'Outfit',sans-serif;">
+        {html.escape(label)}</button>
+    <script>
+    const text = {payload};
+    const btn = document.getElementById("copy");
+    btn.onclick = async () => {{
+        try {{
+            await navigator.clipboard.writeText(text);
+        }} catch (e) {{
+            // Sandboxed iframes may lack clipboard-write; fall back to execCommand
+            const ta = document.createElement("textarea");
+            ta.value = text;
+            document.body.appendChild(ta);
+            ta.select();
+            document.execCommand("copy");
+            ta.remove();
+        }}
+        btn.textContent = "✅ Copied!";
+        setTimeout(() => btn.textContent = {json.dumps(label)}, 1500);
+    }};
+    </script>
+    """
+    # st.iframe replaces the deprecated components.html in newer Streamlit
+    if hasattr(st, "iframe"):
+        st.iframe(markup, height=45)
+    else:
+        components.html(markup, height=45)
+
+@st.fragment
+def action_bar(cmd: str, preset: StylePreset, params: dict):
+    """Save/Submit buttons; clicking them reruns only this fragment.
+
+    A save is written to the state backend straight away, so other tabs and
+    replicas see it and nothing is lost if the tab closes. What waits for the
+    next full run is re-rendering History and Analytics, which is where a full
+    run's cost goes.
+    """
+    cpu_start = time.thread_time()
+    # The body also runs inside every full run; only count reruns of the fragment alone
+    fragment_only = not st.session_state.get("in_full_run")
+    b2, b3 = st.columns(2) if RENDER_URL else (st.container(), None)
+    with b2:
+        if st.button("💾 Save to History", use_container_width=True):
+            # Widget values are stored as-is; cmd also holds free text and is never parsed back
+            entry = {"id": uuid.uuid4().hex, "name": preset.name, "cmd": cmd, "preset_id": preset.id,
+                     "saved_at": time.time(), **params}
+            st.session_state.state_store.append("history", [entry])
+            # Shared across sessions, so kept out of idle-session expiry
+            get_state_backend().append(STORE_SID, STORE_KEY, [HistoryColumns.row(entry)], expire=False)
+            st.session_state.pending_saves.append(entry)
+            st.toast("Saved!", icon="✅")
+    if b3 is not None:
+        with b3:
+            if st.button("🚀 Submit", use_container_width=True):
+                submit_render(cmd, preset.id)
+    pending = len(st.session_state.pending_saves)
+    if pending:
+        # Stored already, but History only re-renders on a full run; say so and offer one now
+        p1, p2 = st.columns([2, 1])
+        p1.caption(f"🕒 {pending} saved, not yet shown in History")
+        if p2.button("↻ Update", key="flush_saves", use_container_width=True):
+            st.rerun(scope="app")
+    persist_state()
+    if PERF and fragment_only:
+        st.session_state.perf["fragment_runs"] += 1
+        st.session_state.perf["fragment_cpu"] += time.thread_time() - cpu_start
 
 
 # -----------------------------
@@ -775,25 +440,155 @@ with right:
     st.code(cmd, language=None)
     
     # Action buttons
-    b1, b2 = st.columns(2)
+    b1, b2 = st.columns([1, 2 if RENDER_URL else 1])
     with b1:
-        if st.button("📋 Copy (use code above)", use_container_width=True):
-            st.toast("Select and copy from the code block above!", icon="📋")
+        copy_button(cmd)
     with b2:
-        if st.button("💾 Save to History", use_container_width=True):
-            st.session_state.history.append({"name": current.name, "cmd": cmd})
-            st.toast("Saved!", icon="✅")
+        st.session_state.in_full_run = True
+        params = {"sw": sw, "stylize": stylize, "ar": ar.strip().replace("--ar ", ""), "cref": bool(cref.strip())}
+        action_bar(cmd, current, params)
+        st.session_state.in_full_run = False
 
 # History
 if st.session_state.history:
     st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
     with st.expander(f"📜 History ({len(st.session_state.history)})", expanded=False):
         if st.button("🗑️ Clear All"):
+            st.session_state.state_store.clear_list("history")
             st.session_state.history = []
+            st.session_state.pending_saves = []
             st.rerun()
+        # Linked renders cost a query and file stats, so they load only on request
+        linked = {}
+        if get_gallery().count() and st.toggle("🖼️ Show linked renders", key="history_renders"):
+            linked = get_gallery().for_histories([h['id'] for h in st.session_state.history])
         for i, h in enumerate(reversed(st.session_state.history)):
             st.markdown(f"**{i+1}. {h['name']}**")
             st.code(h['cmd'], language=None)
+            if RENDER_URL and st.button("🚀 Submit", key=f"hist_submit_{i}"):
+                submit_render(h['cmd'], h.get('preset_id', ""))
+            thumbs = [t for t in (get_gallery().thumbnail(g) for g in linked.get(h['id'], [])) if t]
+            if thumbs:
+                st.image(thumbs, width=96)
+
+# Gallery
+gallery = get_gallery()
+with st.expander(f"🖼️ Gallery ({gallery.count()})", expanded=False):
+    # Ingest: link a folder or file of renders to a saved history entry
+    g1, g2, g3 = st.columns([3, 2, 1])
+    with g1:
+        ingest_path = st.text_input(
+            "Image file or folder", "", placeholder=f"File or folder in {GALLERY_ROOT}", label_visibility="collapsed",
+        )
+    with g2:
+        entries = list(reversed(st.session_state.history))
+        link = st.selectbox(
+            "Link to history entry", [None] + entries, label_visibility="collapsed",
+            format_func=lambda h: "No history link" if h is None else f"{h['name']}: {h['cmd'][16:56]}…",
+        )
+    with g3:
+        if st.button("➕ Ingest", use_container_width=True) and ingest_path.strip():
+            # Relative paths are taken from the root; anything resolving outside it is refused
+            target = os.path.join(GALLERY_ROOT, ingest_path.strip())
+            if not within_root(target, GALLERY_ROOT):
+                st.toast(f"Only images under {GALLERY_ROOT} can be ingested", icon="⚠️")
+            elif not os.path.exists(target):
+                st.toast("Path not found", icon="⚠️")
+            else:
+                added, skipped = gallery.ingest(
+                    [target],
+                    preset_id=link.get("preset_id", "") if link else st.session_state.selected_id,
+                    history_id=link["id"] if link else "",
+                    cmd=link["cmd"] if link else "",
+                    root=GALLERY_ROOT,
+                )
+                note = f", skipped {skipped} unreadable or outside the root" if skipped else ""
+                st.toast(f"Added {added} images{note}", icon="⚠️" if skipped else "🖼️")
+
+    # Browsing stats and thumbnails files, so it only runs while switched on
+    v1, v2 = st.columns([3, 1])
+    with v1:
+        browsing = st.toggle("Show thumbnails", key="gallery_open")
+    with v2:
+        if st.button("🧹 Prune missing", use_container_width=True):
+            st.toast(f"Removed {gallery.prune_missing()} missing images", icon="🧹")
+
+    if not browsing:
+        shown, captions = [], []
+    elif st.session_state.similar_to is not None:
+        source = st.session_state.similar_to
+        matches = gallery.similar(source)
+        st.markdown(f"**Near-duplicates of** `{os.path.basename(source.path)}` ({len(matches)})")
+        if st.button("✖ Back to gallery"):
+            st.session_state.similar_to = None
+            st.rerun()
+        shown = [g for _, g in matches]
+        captions = [f"distance {d} · {get_preset(g.preset_id).name if g.preset_id else '—'}" for d, g in matches]
+    else:
+        pages = max(1, -(-gallery.count() // GALLERY_PAGE_SIZE))
+        st.session_state.gallery_page = min(st.session_state.gallery_page, pages - 1)
+        p1, p2, p3 = st.columns([1, 2, 1])
+        with p1:
+            if st.button("◀ Prev", disabled=st.session_state.gallery_page == 0):
+                st.session_state.gallery_page -= 1
+                st.rerun()
+        with p2:
+            st.caption(f"Page {st.session_state.gallery_page + 1} of {pages}")
+        with p3:
+            if st.button("Next ▶", disabled=st.session_state.gallery_page >= pages - 1):
+                st.session_state.gallery_page += 1
+                st.rerun()
+        shown = gallery.page(st.session_state.gallery_page, GALLERY_PAGE_SIZE)
+        captions = [get_preset(g.preset_id).name if g.preset_id else os.path.basename(g.path) for g in shown]
+
+    thumb_cols = st.columns(4)
+    for i, (g, caption) in enumerate(zip(shown, captions)):
+        with thumb_cols[i % 4]:
+            thumb = gallery.thumbnail(g)
+            if thumb is None:
+                st.caption(f"⚠️ Missing: {os.path.basename(g.path)}")
+                continue
+            st.image(thumb, caption=caption, use_container_width=True)
+            if st.button("🔍 Similar", key=f"sim_{g.id}"):
+                st.session_state.similar_to = g
+                st.rerun()
+
+# Analytics (rendered from running aggregates, never from the raw rows)
+stats = get_analytics().summary({p.id: p.name for p in PRESETS})
+if get_analytics().loading:
+    st.caption("📊 Loading saved-command analytics…")
+if stats["total"]:
+    with st.expander(f"📊 Analytics ({stats['total']} saves)", expanded=False):
+        m1, m2 = st.columns(2)
+        m1.metric("Saved commands", stats["total"])
+        m2.metric("--cref usage", f"{stats['cref_rate']:.0%}")
+        t_presets, t_sw, t_sty, t_ar = st.tabs(["🎭 Presets", "--sw", "--stylize", "Aspect Ratio"])
+        with t_presets:
+            st.bar_chart(stats["presets"].head(15), horizontal=True)
+        with t_sw:
+            st.bar_chart(stats["sw"])
+        with t_sty:
+            st.bar_chart(stats["stylize"])
+        with t_ar:
+            st.bar_chart(stats["ar"])
+
+# Render jobs (read straight from the job store, so this never waits on the backend)
+if RENDER_URL:
+    try:
+        jobs = get_dispatcher().store.recent(20)
+    except RuntimeError as e:
+        st.error(f"🚀 Render queue unavailable: {e}")
+        jobs = []
+    if jobs:
+        active = sum(j.status not in TERMINAL for j in jobs)
+        with st.expander(f"🚀 Render Jobs ({active} active)", expanded=False):
+            st.button("🔄 Refresh", key="jobs_refresh")
+            for j in jobs:
+                st.markdown(f"`{j.status}` · attempt {j.attempts} · {j.command[:80]}…")
+                if j.result:
+                    st.caption(j.result)
+                elif j.error:
+                    st.caption(f"⚠️ {j.error}")
 
 # Footer tips
 st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
@@ -803,3 +598,15 @@ st.markdown("""
     Swap --sref for instant style changes
 </div>
 """, unsafe_allow_html=True)
+
+persist_state()
+
+if PERF:
+    perf = st.session_state.perf
+    perf["app_runs"] += 1
+    perf["app_cpu"] += time.thread_time() - _script_cpu_start
+    st.sidebar.caption(
+        f"Full runs: {perf['app_runs']} · {1000 * perf['app_cpu'] / perf['app_runs']:.1f} ms CPU avg  \n"
+        f"Fragment runs: {perf['fragment_runs']} · "
+        f"{1000 * perf['fragment_cpu'] / max(1, perf['fragment_runs']):.1f} ms CPU avg"
+    )